@@ -0,0 +1,177 @@
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+from pathlib import Path
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from dotenv import load_dotenv
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+load_dotenv()
+
+STATIC_DIR = Path("static")
+STATIC_URL = "/static"
+# Re-read changed files on request (development only)
+STATIC_HOT_RELOAD = os.getenv("STATIC_HOT_RELOAD", "false").lower() in ("1", "true", "yes")
+
+# Hashed URLs never change content, unhashed ones must be revalidated
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# Files smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 256
+
+# References like "/static/enhance.css" inside HTML/CSS get rewritten to hashed URLs
+STATIC_REFERENCE = re.compile(r"""(["'(])/static/([^"'()?#]+)(["')])""")
+
+
+class StaticAsset:
+    """A static file held in memory together with its precompressed variants"""
+
+    def __init__(self, name: str, path: Path, content: bytes):
+        self.name = name
+        self.path = path
+        self.mtime = path.stat().st_mtime
+        self.content = content
+        self.media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if self.media_type.startswith("text/") or self.media_type == "application/javascript":
+            self.media_type += "; charset=utf-8"
+        self.hash = hashlib.sha256(content).hexdigest()[:12]
+
+        stem, dot, suffix = name.rpartition(".")
+        self.hashed_name = f"{stem}.{self.hash}.{suffix}" if dot else f"{name}.{self.hash}"
+
+        # Encoding -> (body, strong ETag)
+        self.variants = {"identity": (content, f'"{self.hash}"')}
+        if len(content) >= MIN_COMPRESS_SIZE and self.media_type.startswith(COMPRESSIBLE_TYPES):
+            gzipped = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(gzipped) < len(content):
+                self.variants["gzip"] = (gzipped, f'"{self.hash}-gz"')
+            if brotli is not None:
+                compressed = brotli.compress(content, quality=11)
+                if len(compressed) < len(content):
+                    self.variants["br"] = (compressed, f'"{self.hash}-br"')
+
+    @property
+    def url(self) -> str:
+        return f"{STATIC_URL}/{self.hashed_name}"
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    """Parse Accept-Encoding, dropping codings explicitly refused with q=0"""
+    encodings = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if coding and params not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            encodings.add(coding.lower())
+    return encodings
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison as required for If-None-Match"""
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+class AssetStore:
+    """In-memory static files addressable by plain and content-hashed names"""
+
+    def __init__(self, directory: Path, hot_reload: bool = False):
+        self.directory = directory
+        self.hot_reload = hot_reload
+        self.assets: dict[str, StaticAsset] = {}
+        self.hashed: dict[str, StaticAsset] = {}
+
+    def load(self):
+        """Read all files in the static directory, compress and hash them"""
+        raw = {}
+        if self.directory.exists():
+            for path in sorted(self.directory.rglob("*")):
+                if path.is_file():
+                    raw[path.relative_to(self.directory).as_posix()] = path
+
+        assets = {}
+        # Plain assets first, then CSS, then HTML so references resolve to hashed URLs
+        text_types = (".css", ".html")
+        order = lambda item: (item[0].endswith(text_types), item[0].endswith(".html"))
+        for name, path in sorted(raw.items(), key=order):
+            content = path.read_bytes()
+            if name.endswith(text_types):
+                content = self._rewrite_references(content, assets)
+            assets[name] = StaticAsset(name, path, content)
+
+        self.assets = assets
+        self.hashed = {asset.hashed_name: asset for asset in assets.values()}
+        print(f"Static assets loaded: {len(assets)} files")
+
+    def _rewrite_references(self, content: bytes, assets: dict[str, StaticAsset]) -> bytes:
+        def replace(match):
+            asset = assets.get(match.group(2))
+            if asset is None:
+                return match.group(0)
+            return f"{match.group(1)}{asset.url}{match.group(3)}"
+
+        try:
+            text = content.decode("utf-8")
+        except UnicodeDecodeError:
+            return content
+        return STATIC_REFERENCE.sub(replace, text).encode("utf-8")
+
+    def _is_stale(self) -> bool:
+        if not self.directory.exists():
+            return bool(self.assets)
+        current = {
+            path.relative_to(self.directory).as_posix(): path.stat().st_mtime
+            for path in self.directory.rglob("*") if path.is_file()
+        }
+        return current != {name: asset.mtime for name, asset in self.assets.items()}
+
+    def get(self, name: str) -> tuple[Optional[StaticAsset], bool]:
+        """Look up an asset; returns (asset, requested via hashed URL)"""
+        if self.hot_reload and self._is_stale():
+            self.load()
+        if name in self.hashed:
+            return self.hashed[name], True
+        return self.assets.get(name), False
+
+    def response(self, request: Request, asset: StaticAsset, immutable: bool = False) -> Response:
+        """Serve the best precompressed variant with ETag and conditional GET support"""
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = "identity"
+        for candidate in ("br", "gzip"):
+            if candidate in asset.variants and candidate in accepted:
+                encoding = candidate
+                break
+        body, etag = asset.variants[encoding]
+
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding"
+        }
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            body = b""
+        return Response(content=body, media_type=asset.media_type, headers=headers)
+
+
+static_assets = AssetStore(STATIC_DIR, hot_reload=STATIC_HOT_RELOAD)
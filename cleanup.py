@@ -4,6 +4,8 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from dotenv import load_dotenv
 
+from monitoring import compact_old_requests
+
 load_dotenv()
 
 STORAGE_DAYS = int(os.getenv("STORAGE_DAYS", "7") or "7")
@@ -56,6 +58,9 @@ async def start_cleanup_task():
             # Run cleanup
             await cleanup_old_files()
             
+            # Compact old request history into daily aggregates
+            await compact_old_requests()
+            
             # Wait a bit before next iteration to avoid double execution
             await asyncio.sleep(60)
             
@@ -1,4 +1,7 @@
 import os
+import hmac
+import json
+import time
 import httpx
 import asyncio
 import hashlib
@@ -7,15 +10,18 @@ from pathlib import Path
 from typing import Optional
 from concurrent.futures import ThreadPoolExecutor
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Form
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Form, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, FileResponse, Response, PlainTextResponse
 from dotenv import load_dotenv
 import aiofiles
 from pydub import AudioSegment
 
-from monitoring import init_database, log_request, get_today_stats, send_daily_summary, get_seconds_until_midnight, get_week_requests
+from monitoring import init_database, log_request, get_today_stats, send_daily_summary, get_seconds_until_midnight, get_week_requests, get_request_history, get_daily_history
+from peaks import write_peaks, peaks_path_for
+import profiling
+from assets import static_assets
+from scheduling import FairScheduler, RateLimiter, get_client_id, pseudonymize_client_id, parse_client_weights, RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST, CLIENT_WEIGHTS
 
 # .env-Datei laden
 load_dotenv()
@@ -24,8 +30,20 @@ load_dotenv()
 max_workers = os.getenv("MAX_CONCURRENT_ENHANCEMENTS", "5")
 executor = ThreadPoolExecutor(max_workers=int(max_workers) if max_workers else 5)
 
+# Fair-share Scheduling und Rate Limiting pro Client
+enhancement_scheduler = FairScheduler(
+    slots=int(max_workers) if max_workers else 5,
+    weights=parse_client_weights(CLIENT_WEIGHTS)
+)
+rate_limiter = RateLimiter(per_minute=RATE_LIMIT_PER_MINUTE, burst=RATE_LIMIT_BURST)
+
 # FastAPI App initialisieren
-app = FastAPI(title="Audio Enhancer API", version="1.0.0")
+app = FastAPI(
+    title="Audio Enhancer API",
+    version="1.0.0",
+    # Let the profiler sample each endpoint's own task
+    dependencies=[Depends(profiling.register_request_task)]
+)
 
 # Konfiguration
 AI_COUSTICS_API_KEY = os.getenv("AI_COUSTICS_API_KEY")
@@ -33,6 +51,7 @@ AI_COUSTICS_API_URL = "https://api.ai-coustics.io/v1"
 UPLOAD_MAX_SIZE_MB = int(os.getenv("UPLOAD_MAX_SIZE_MB", "150") or "150")
 STORAGE_DAYS = int(os.getenv("STORAGE_DAYS", "7") or "7")
 ENHANCED_DIR = Path("data/enhanced")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
 # Ensure enhanced directory exists
 ENHANCED_DIR.mkdir(parents=True, exist_ok=True)
@@ -102,14 +121,16 @@ async def schedule_daily_summary():
 async def startup_event():
     """Initialize database and start background tasks on startup"""
     await init_database()
+    # Load and precompress frontend/static assets
+    static_assets.load()
     # Start daily summary scheduler
     asyncio.create_task(schedule_daily_summary())
     # Start cleanup task
     from cleanup import start_cleanup_task
     asyncio.create_task(start_cleanup_task())
-
-# Static Files fuer Frontend
-app.mount("/static", StaticFiles(directory="static"), name="static")
+    # Start sampling profiler
+    if profiling.PROFILER_ENABLED:
+        profiling.profiler.start()
 
 # CORS-Middleware
 app.add_middleware(
@@ -127,6 +148,27 @@ async def add_security_headers(request: Request, call_next):
     response.headers["Content-Security-Policy"] = "frame-ancestors *"
     return response
 
+@app.middleware("http")
+async def capture_slow_requests(request: Request, call_next):
+    """Store stack samples and phase timings of requests above the latency threshold"""
+    trace_token = profiling.start_trace()
+    start = time.monotonic()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        end = time.monotonic()
+        trace = profiling.end_trace(trace_token)
+        if end - start >= profiling.slow_request_threshold:
+            # Write the capture in the background so the response isn't delayed
+            asyncio.get_event_loop().run_in_executor(
+                None,
+                profiling.save_capture,
+                request.method, request.url.path, status_code, end - start, start, end, trace
+            )
+
 def generate_file_hash(content: bytes) -> str:
     """Generate a unique hash for file content"""
     return hashlib.sha256(content).hexdigest()[:12]
@@ -240,13 +282,21 @@ async def enhance_audio_with_ai_coustics(
             raise HTTPException(status_code=500, detail=f"Enhancement failed: {str(e)}")
 
 @app.get("/", response_class=HTMLResponse)
-async def get_frontend():
+async def get_frontend(request: Request):
     """Audio Enhancement Frontend"""
-    try:
-        with open("static/enhance.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
+    asset, _ = static_assets.get("enhance.html")
+    if asset is None:
         return HTMLResponse(content="<h1>Frontend not found</h1>", status_code=500)
+    return static_assets.response(request, asset)
+
+# Static Files fuer Frontend (aus dem Speicher, vorkomprimiert)
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def get_static_file(path: str, request: Request):
+    """Serve static assets; content-hashed URLs are cached long-term"""
+    asset, immutable = static_assets.get(path)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return static_assets.response(request, asset, immutable=immutable)
 
 @app.get("/api/presets")
 async def get_presets():
@@ -255,6 +305,7 @@ async def get_presets():
 
 @app.post("/api/enhance")
 async def enhance_audio(
+    request: Request,
     file: UploadFile = File(...),
     preset: str = Form("custom"),
     loudness_target: Optional[int] = Form(None),
@@ -264,6 +315,10 @@ async def enhance_audio(
 ):
     """Enhance audio file endpoint"""
     
+    # Per-client rate limit
+    client_id = get_client_id(request)
+    rate_limiter.check(client_id)
+    
     # Validate file type
     if not file.content_type or not file.content_type.startswith("audio/"):
         raise HTTPException(status_code=400, detail="Only audio files are allowed")
@@ -272,13 +327,6 @@ async def enhance_audio(
     if file.size and file.size > UPLOAD_MAX_SIZE_MB * 1024 * 1024:
         raise HTTPException(status_code=413, detail=f"File too large. Maximum {UPLOAD_MAX_SIZE_MB}MB allowed")
     
-    # Read file data
-    file_data = await file.read()
-    
-    # Additional size check
-    if len(file_data) > UPLOAD_MAX_SIZE_MB * 1024 * 1024:
-        raise HTTPException(status_code=413, detail=f"File too large. Maximum {UPLOAD_MAX_SIZE_MB}MB allowed")
-    
     # Prepare custom parameters if provided
     custom_params = None
     if preset == "custom" and any([loudness_target, loudness_peak, enhancement_level]):
@@ -290,74 +338,104 @@ async def enhance_audio(
         if enhancement_level is not None:
             custom_params["enhancement_level"] = max(0, min(1, enhancement_level))
     
-    start_time = datetime.now()
-    
-    try:
-        # Save original file temporarily for duration calculation
-        temp_file_hash = generate_file_hash(file_data)
-        temp_file_path = ENHANCED_DIR / f"temp_{temp_file_hash}"
-        
-        async with aiofiles.open(temp_file_path, "wb") as f:
-            await f.write(file_data)
-        
-        # Get audio duration
-        audio_duration = await get_audio_duration(temp_file_path)
+    # Wait for a fair-share slot so one client's batch cannot starve the others
+    async with enhancement_scheduler.slot(client_id) as queue_wait:
+        profiling.record_span("queue_wait", queue_wait)
+        start_time = datetime.now()
         
-        # Enhance audio
-        enhanced_data, api_file_name = await enhance_audio_with_ai_coustics(
-            file_data,
-            file.content_type,
-            preset,
-            custom_params,
-            model_arch
-        )
-        
-        # Generate filename for storage
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_extension = "mp3" if "mp3" in file.content_type.lower() else "wav"
-        enhanced_filename = f"enhanced_{timestamp}_{api_file_name}.{file_extension}"
-        enhanced_path = ENHANCED_DIR / enhanced_filename
-        
-        # Save enhanced file
-        async with aiofiles.open(enhanced_path, "wb") as f:
-            await f.write(enhanced_data)
+        # Read file data only once running, queued uploads stay spooled on disk
+        file_data = await file.read()
         
-        # Clean up temp file
-        temp_file_path.unlink(missing_ok=True)
-        
-        # Calculate processing time
-        processing_time = (datetime.now() - start_time).total_seconds()
-        
-        # Log successful request
-        await log_request(
-            success=True,
-            preset=f"{preset} ({model_arch})",
-            duration_seconds=audio_duration,
-            processing_time=processing_time,
-            file_size_mb=len(file_data) / (1024 * 1024),
-            enhanced_filename=enhanced_filename
-        )
+        # Additional size check
+        if len(file_data) > UPLOAD_MAX_SIZE_MB * 1024 * 1024:
+            raise HTTPException(status_code=413, detail=f"File too large. Maximum {UPLOAD_MAX_SIZE_MB}MB allowed")
         
-        return {
-            "success": True,
-            "filename": enhanced_filename,
-            "download_url": f"/api/download/{enhanced_filename}",
-            "processing_time": round(processing_time, 2),
-            "audio_duration": round(audio_duration, 2),
-            "preset_used": preset
-        }
-        
-    except Exception as e:
-        # Clean up temp file on error
-        if 'temp_file_path' in locals():
+        try:
+            # Save original file temporarily for duration calculation
+            temp_file_hash = generate_file_hash(file_data)
+            temp_file_path = ENHANCED_DIR / f"temp_{temp_file_hash}"
+            
+            async with aiofiles.open(temp_file_path, "wb") as f:
+                await f.write(file_data)
+            
+            # Get audio duration
+            with profiling.span("audio_duration"):
+                audio_duration = await get_audio_duration(temp_file_path)
+            
+            # Enhance audio
+            with profiling.span("ai_coustics"):
+                enhanced_data, api_file_name = await enhance_audio_with_ai_coustics(
+                    file_data,
+                    file.content_type,
+                    preset,
+                    custom_params,
+                    model_arch
+                )
+            
+            # Generate filename for storage
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            file_extension = "mp3" if "mp3" in file.content_type.lower() else "wav"
+            enhanced_filename = f"enhanced_{timestamp}_{api_file_name}.{file_extension}"
+            enhanced_path = ENHANCED_DIR / enhanced_filename
+            
+            # Save enhanced file
+            async with aiofiles.open(enhanced_path, "wb") as f:
+                await f.write(enhanced_data)
+            
+            # Precompute waveform peaks for before/after previews
+            loop = asyncio.get_event_loop()
+            with profiling.span("peaks"):
+                await asyncio.gather(
+                    loop.run_in_executor(executor, write_peaks, enhanced_path, peaks_path_for(enhanced_path)),
+                    loop.run_in_executor(executor, write_peaks, temp_file_path, peaks_path_for(enhanced_path, original=True))
+                )
+            
+            # Clean up temp file
             temp_file_path.unlink(missing_ok=True)
             
-        # Log failed request
-        await log_request(success=False, preset=preset, error=str(e))
-        
-        if isinstance(e, HTTPException):
-            raise
-        raise HTTPException(status_code=500, detail=f"Enhancement failed: {str(e)}")
+            # Calculate processing time
+            processing_time = (datetime.now() - start_time).total_seconds()
+            
+            # Log successful request
+            await log_request(
+                success=True,
+                preset=f"{preset} ({model_arch})",
+                duration_seconds=audio_duration,
+                processing_time=processing_time,
+                file_size_mb=len(file_data) / (1024 * 1024),
+                enhanced_filename=enhanced_filename,
+                client_id=pseudonymize_client_id(client_id),
+                queue_wait_seconds=queue_wait
+            )
+            
+            return {
+                "success": True,
+                "filename": enhanced_filename,
+                "download_url": f"/api/download/{enhanced_filename}",
+                "peaks_url": f"/api/peaks/{enhanced_filename}",
+                "processing_time": round(processing_time, 2),
+                "queue_wait": round(queue_wait, 2),
+                "audio_duration": round(audio_duration, 2),
+                "preset_used": preset
+            }
+            
+        except Exception as e:
+            # Clean up temp file on error
+            if 'temp_file_path' in locals():
+                temp_file_path.unlink(missing_ok=True)
+                
+            # Log failed request
+            await log_request(
+                success=False,
+                preset=f"{preset} ({model_arch})",
+                error=str(e),
+                client_id=pseudonymize_client_id(client_id),
+                queue_wait_seconds=queue_wait
+            )
+            
+            if isinstance(e, HTTPException):
+                raise
+            raise HTTPException(status_code=500, detail=f"Enhancement failed: {str(e)}")
 
 @app.get("/api/download/{filename}")
 async def download_enhanced_file(filename: str):
@@ -367,6 +445,10 @@ async def download_enhanced_file(filename: str):
     if "/" in filename or "\\" in filename or ".." in filename:
         raise HTTPException(status_code=400, detail="Invalid filename")
     
+    # Only serve enhanced audio, not peaks sidecars or temp uploads
+    if not filename.endswith((".mp3", ".wav")):
+        raise HTTPException(status_code=404, detail="File not found")
+    
     file_path = ENHANCED_DIR / filename
     
     if not file_path.exists():
@@ -381,16 +463,206 @@ async def download_enhanced_file(filename: str):
         filename=filename
     )
 
+def parse_range_header(range_header: str, size: int) -> Optional[tuple[int, int]]:
+    """Parse a single `bytes=start-end` range, returns inclusive bounds.
+
+    Returns None for ranges we don't support (other units, multiple ranges,
+    malformed values) so the caller sends the full body, and raises
+    ValueError for a byte range that cannot be satisfied.
+    """
+    if not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start_str, _, end_str = range_header[len("bytes="):].strip().partition("-")
+    try:
+        start = int(start_str) if start_str else None
+        end = int(end_str) if end_str else None
+    except ValueError:
+        return None
+    
+    if start is None:
+        # Suffix range: last N bytes
+        if end is None or end < 0:
+            return None
+        if end == 0 or size == 0:
+            raise ValueError("Range not satisfiable")
+        return max(0, size - end), size - 1
+    
+    if start < 0 or (end is not None and end < start):
+        return None
+    if start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, size - 1 if end is None else min(end, size - 1)
+
+@app.get("/api/peaks/{filename}")
+async def get_waveform_peaks(filename: str, request: Request, source: str = "enhanced"):
+    """Serve precomputed waveform peaks (binary sidecar) with range support"""
+    
+    # Validate filename (prevent directory traversal)
+    if "/" in filename or "\\" in filename or ".." in filename:
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    
+    if source not in ("enhanced", "original"):
+        raise HTTPException(status_code=400, detail="Source must be 'enhanced' or 'original'")
+    
+    peaks_path = peaks_path_for(ENHANCED_DIR / filename, original=(source == "original"))
+    
+    if not peaks_path.exists():
+        raise HTTPException(status_code=404, detail="Peaks not found")
+    
+    async with aiofiles.open(peaks_path, "rb") as f:
+        data = await f.read()
+    
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": "public, max-age=86400"}
+    range_header = request.headers.get("range")
+    
+    if range_header:
+        try:
+            byte_range = parse_range_header(range_header, len(data))
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{len(data)}"}
+            )
+        # Unsupported range forms are ignored and answered with the full body
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            return Response(
+                content=data[start:end + 1],
+                status_code=206,
+                media_type="application/octet-stream",
+                headers=headers
+            )
+    
+    return Response(content=data, media_type="application/octet-stream", headers=headers)
+
 @app.get("/api/stats")
 async def get_stats():
     """Get today's enhancement statistics"""
     return await get_today_stats()
 
+def parse_history_time(value: Optional[str], name: str) -> Optional[str]:
+    """Validate an ISO date/datetime query parameter.
+
+    Timestamps are stored as naive local time, so values with an offset
+    (e.g. "Z" or "+02:00") are converted to local time first.
+    """
+    if value is None:
+        return None
+    try:
+        # fromisoformat() in Python 3.11 accepts a trailing "Z"
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}, expected ISO date or datetime")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.isoformat()
+
+@app.get("/api/history")
+async def get_history(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    success: Optional[bool] = None,
+    preset: Optional[str] = None,
+    model_arch: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100
+):
+    """Get enhancement requests in a time range (newest first, keyset paginated)"""
+    try:
+        return await get_request_history(
+            start=parse_history_time(start, "start"),
+            end=parse_history_time(end, "end"),
+            success=success,
+            preset=preset,
+            model_arch=model_arch,
+            cursor=cursor,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/history/daily")
+async def get_history_daily(start: Optional[str] = None, end: Optional[str] = None):
+    """Get per-day totals, including days already compacted by the retention job"""
+    return await get_daily_history(
+        start=parse_history_time(start, "start"),
+        end=parse_history_time(end, "end")
+    )
+
+def require_admin(token: Optional[str]):
+    """Check the admin token; admin endpoints are disabled without ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints disabled")
+    if not token or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.get("/api/scheduler")
+async def get_scheduler_stats(x_admin_token: Optional[str] = Header(None)):
+    """Get per-client queue length and wait times"""
+    require_admin(x_admin_token)
+    return enhancement_scheduler.get_stats()
+
 @app.get("/api/week-requests")
 async def get_week_requests_endpoint():
     """Get all enhancement requests from the last 7 days"""
     return await get_week_requests()
 
+@app.get("/api/admin/profiler")
+async def get_profiler_status(x_admin_token: Optional[str] = Header(None)):
+    """Get profiler status and stored slow-request captures"""
+    require_admin(x_admin_token)
+    return profiling.get_status()
+
+@app.post("/api/admin/profiler")
+async def update_profiler(
+    enabled: Optional[bool] = None,
+    threshold_seconds: Optional[float] = None,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Turn the sampling profiler on/off and change the slow-request threshold"""
+    require_admin(x_admin_token)
+    
+    if enabled is True:
+        profiling.profiler.start()
+    elif enabled is False:
+        profiling.profiler.stop()
+    
+    if threshold_seconds is not None:
+        try:
+            profiling.set_slow_request_threshold(threshold_seconds)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    return profiling.get_status()
+
+@app.get("/api/admin/profiler/captures/{name}")
+async def download_profiler_capture(
+    name: str,
+    format: str = "json",
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Download a capture as JSON or as collapsed stacks for flamegraph tools"""
+    require_admin(x_admin_token)
+    
+    # Validate filename (prevent directory traversal)
+    if "/" in name or "\\" in name or ".." in name:
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    
+    capture_path = profiling.PROFILE_DIR / name
+    if not capture_path.exists():
+        raise HTTPException(status_code=404, detail="Capture not found")
+    
+    if format == "folded":
+        async with aiofiles.open(capture_path, "r", encoding="utf-8") as f:
+            capture = json.loads(await f.read())
+        return PlainTextResponse(
+            content=profiling.capture_to_folded(capture),
+            headers={"Content-Disposition": f'attachment; filename="{capture_path.stem}.folded"'}
+        )
+    
+    return FileResponse(path=capture_path, media_type="application/json", filename=name)
+
 if __name__ == "__main__":
     import uvicorn
     
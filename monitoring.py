@@ -1,4 +1,5 @@
 import os
+import base64
 import httpx
 import aiosqlite
 from datetime import datetime, date, timedelta
@@ -10,6 +11,8 @@ load_dotenv()
 DATABASE_PATH = "data/audio.db"
 SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL")
 SLACK_CHANNEL = os.getenv("SLACK_CHANNEL", "#audio-enhancer")
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "90") or "90")
+HISTORY_MAX_PAGE_SIZE = 500
 
 async def init_database():
     """Initialize SQLite database for request logging"""
@@ -28,6 +31,8 @@ async def init_database():
                 file_size_mb REAL,
                 error_message TEXT,
                 enhanced_filename TEXT,
+                client_id TEXT,
+                queue_wait_seconds REAL,
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP
             )
         """)
@@ -38,6 +43,26 @@ async def init_database():
             ON enhancement_requests(date)
         """)
         
+        # Create index for time-range queries and keyset pagination
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_timestamp_id 
+            ON enhancement_requests(timestamp, id)
+        """)
+        
+        # Daily aggregates for rows compacted by the retention job
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS daily_aggregates (
+                date TEXT NOT NULL,
+                preset TEXT NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                successful INTEGER NOT NULL DEFAULT 0,
+                total_duration_seconds REAL NOT NULL DEFAULT 0,
+                total_processing_time REAL NOT NULL DEFAULT 0,
+                total_size_mb REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (date, preset)
+            )
+        """)
+        
         # Add enhanced_filename column if it doesn't exist
         cursor = await db.execute("PRAGMA table_info(enhancement_requests)")
         columns = await cursor.fetchall()
@@ -49,6 +74,19 @@ async def init_database():
                 ADD COLUMN enhanced_filename TEXT
             """)
         
+        # Add per-client usage columns if they don't exist
+        if 'client_id' not in column_names:
+            await db.execute("""
+                ALTER TABLE enhancement_requests 
+                ADD COLUMN client_id TEXT
+            """)
+        
+        if 'queue_wait_seconds' not in column_names:
+            await db.execute("""
+                ALTER TABLE enhancement_requests 
+                ADD COLUMN queue_wait_seconds REAL
+            """)
+        
         await db.commit()
 
 async def log_request(
@@ -58,7 +96,9 @@ async def log_request(
     processing_time: float = 0,
     file_size_mb: float = 0,
     error: Optional[str] = None,
-    enhanced_filename: Optional[str] = None
+    enhanced_filename: Optional[str] = None,
+    client_id: Optional[str] = None,
+    queue_wait_seconds: float = 0
 ):
     """Log an enhancement request to database"""
     try:
@@ -71,10 +111,12 @@ async def log_request(
             await db.execute(
                 """INSERT INTO enhancement_requests 
                    (date, timestamp, success, preset, duration_seconds, 
-                    processing_time, file_size_mb, error_message, enhanced_filename) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    processing_time, file_size_mb, error_message, enhanced_filename,
+                    client_id, queue_wait_seconds) 
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
                 (today, timestamp, success, preset, duration_seconds, 
-                 processing_time, file_size_mb, error, enhanced_filename)
+                 processing_time, file_size_mb, error, enhanced_filename,
+                 client_id, queue_wait_seconds)
             )
             await db.commit()
             
@@ -113,6 +155,19 @@ async def get_today_stats():
             )
             preset_stats = await cursor.fetchall()
             
+            # Per-client usage
+            cursor = await db.execute(
+                """SELECT COALESCE(client_id, 'unknown') as client, 
+                    COUNT(*) as count,
+                    AVG(queue_wait_seconds) as avg_wait
+                   FROM enhancement_requests 
+                   WHERE date = ?
+                   GROUP BY client
+                   ORDER BY count DESC""",
+                (today,)
+            )
+            client_stats = await cursor.fetchall()
+            
             return {
                 "total": row[0] or 0,
                 "successful": row[1] or 0,
@@ -120,7 +175,11 @@ async def get_today_stats():
                 "total_audio_minutes": round((row[2] or 0) / 60, 2),
                 "avg_processing_seconds": round(row[3] or 0, 2),
                 "total_size_mb": round(row[4] or 0, 2),
-                "presets": {preset: count for preset, count in preset_stats}
+                "presets": {preset: count for preset, count in preset_stats},
+                "clients": {
+                    client: {"requests": count, "avg_wait_seconds": round(avg_wait or 0, 2)}
+                    for client, count, avg_wait in client_stats
+                }
             }
     except Exception as e:
         print(f"Stats error: {e}")
@@ -131,7 +190,8 @@ async def get_today_stats():
             "total_audio_minutes": 0,
             "avg_processing_seconds": 0,
             "total_size_mb": 0,
-            "presets": {}
+            "presets": {},
+            "clients": {}
         }
 
 async def send_daily_summary():
@@ -236,9 +296,11 @@ async def get_week_requests():
                 processing_time,
                 file_size_mb,
                 error_message,
-                enhanced_filename
+                enhanced_filename,
+                client_id,
+                queue_wait_seconds
             FROM enhancement_requests 
-            WHERE date >= ? 
+            WHERE timestamp >= ? 
             ORDER BY timestamp DESC
             LIMIT 100
         """, (week_ago,))
@@ -273,7 +335,198 @@ async def get_week_requests():
                 "processing_time": round(row[4] or 0, 1),
                 "file_size_mb": round(row[5] or 0, 2),
                 "error_message": row[6],
-                "enhanced_filename": enhanced_filename
+                "enhanced_filename": enhanced_filename,
+                "client_id": row[8],
+                "queue_wait_seconds": round(row[9] or 0, 1)
             })
         
-        return results
\ No newline at end of file
+        return results
+
+def encode_history_cursor(timestamp: str, row_id: int) -> str:
+    """Encode the (timestamp, id) position of the last returned row"""
+    return base64.urlsafe_b64encode(f"{timestamp}|{row_id}".encode()).decode()
+
+def decode_history_cursor(cursor: str) -> tuple[str, int]:
+    """Decode a cursor from encode_history_cursor, raises ValueError if malformed"""
+    try:
+        timestamp, _, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().rpartition("|")
+        return timestamp, int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def escape_like(value: str) -> str:
+    """Escape LIKE wildcards so user input only matches literally (use with ESCAPE '\\')"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+async def get_request_history(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    success: Optional[bool] = None,
+    preset: Optional[str] = None,
+    model_arch: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100
+):
+    """Get enhancement requests in [start, end), newest first, with keyset pagination"""
+    limit = max(1, min(HISTORY_MAX_PAGE_SIZE, limit))
+    
+    conditions = []
+    params = []
+    
+    if start:
+        conditions.append("timestamp >= ?")
+        params.append(start)
+    if end:
+        conditions.append("timestamp < ?")
+        params.append(end)
+    if success is not None:
+        conditions.append("success = ?")
+        params.append(1 if success else 0)
+    if preset:
+        # Stored as "<preset> (<model_arch>)"
+        conditions.append("(preset = ? OR preset LIKE ? ESCAPE '\\')")
+        params.extend([preset, f"{escape_like(preset)} (%"])
+    if model_arch:
+        conditions.append("preset LIKE ? ESCAPE '\\'")
+        params.append(f"% ({escape_like(model_arch)})")
+    if cursor:
+        cursor_timestamp, cursor_id = decode_history_cursor(cursor)
+        conditions.append("(timestamp, id) < (?, ?)")
+        params.extend([cursor_timestamp, cursor_id])
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        db_cursor = await db.execute(f"""
+            SELECT 
+                id,
+                timestamp,
+                success,
+                preset,
+                duration_seconds,
+                processing_time,
+                file_size_mb,
+                error_message,
+                enhanced_filename,
+                client_id,
+                queue_wait_seconds
+            FROM enhancement_requests 
+            {where}
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+        """, (*params, limit + 1))
+        
+        rows = await db_cursor.fetchall()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    items = [{
+        "id": row[0],
+        "timestamp": row[1],
+        "success": bool(row[2]),
+        "preset": row[3],
+        "duration_seconds": round(row[4] or 0, 1),
+        "processing_time": round(row[5] or 0, 1),
+        "file_size_mb": round(row[6] or 0, 2),
+        "error_message": row[7],
+        "enhanced_filename": row[8],
+        "client_id": row[9],
+        "queue_wait_seconds": round(row[10] or 0, 1)
+    } for row in rows]
+    
+    return {
+        "items": items,
+        "next_cursor": encode_history_cursor(rows[-1][1], rows[-1][0]) if has_more else None
+    }
+
+async def get_daily_history(start: Optional[str] = None, end: Optional[str] = None):
+    """Get per-day, per-preset totals from live rows and compacted aggregates.
+
+    Uses the same [start, end) range as get_request_history: a day is
+    included if any part of it lies inside the range.
+    """
+    conditions = []
+    params = []
+    if start:
+        conditions.append("date >= ?")
+        params.append(start[:10])
+    if end:
+        end_time = datetime.fromisoformat(end)
+        end_day = end_time.date()
+        if end_time.time() != datetime.min.time():
+            end_day += timedelta(days=1)
+        conditions.append("date < ?")
+        params.append(end_day.isoformat())
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        cursor = await db.execute(f"""
+            SELECT date, preset, SUM(total), SUM(successful), SUM(total_duration_seconds),
+                   SUM(total_processing_time), SUM(total_size_mb)
+            FROM (
+                SELECT date, COALESCE(preset, 'unknown') as preset, COUNT(*) as total,
+                       SUM(success) as successful,
+                       SUM(COALESCE(duration_seconds, 0)) as total_duration_seconds,
+                       SUM(COALESCE(processing_time, 0)) as total_processing_time,
+                       SUM(COALESCE(file_size_mb, 0)) as total_size_mb
+                FROM enhancement_requests
+                {where}
+                GROUP BY date, preset
+                UNION ALL
+                SELECT date, preset, total, successful, total_duration_seconds,
+                       total_processing_time, total_size_mb
+                FROM daily_aggregates
+                {where}
+            )
+            GROUP BY date, preset
+            ORDER BY date DESC, preset
+        """, (*params, *params))
+        rows = await cursor.fetchall()
+    
+    return [{
+        "date": row[0],
+        "preset": row[1],
+        "total": row[2] or 0,
+        "successful": row[3] or 0,
+        "total_audio_minutes": round((row[4] or 0) / 60, 2),
+        "total_processing_seconds": round(row[5] or 0, 2),
+        "total_size_mb": round(row[6] or 0, 2)
+    } for row in rows]
+
+async def compact_old_requests(retention_days: int = HISTORY_RETENTION_DAYS):
+    """Roll requests older than retention_days into daily_aggregates and delete them"""
+    try:
+        cutoff = (date.today() - timedelta(days=retention_days)).isoformat()
+        
+        async with aiosqlite.connect(DATABASE_PATH) as db:
+            await db.execute("""
+                INSERT INTO daily_aggregates 
+                    (date, preset, total, successful, total_duration_seconds,
+                     total_processing_time, total_size_mb)
+                SELECT date, COALESCE(preset, 'unknown'), COUNT(*), SUM(success),
+                       SUM(COALESCE(duration_seconds, 0)), SUM(COALESCE(processing_time, 0)),
+                       SUM(COALESCE(file_size_mb, 0))
+                FROM enhancement_requests
+                WHERE timestamp < ?
+                GROUP BY date, COALESCE(preset, 'unknown')
+                ON CONFLICT(date, preset) DO UPDATE SET
+                    total = total + excluded.total,
+                    successful = successful + excluded.successful,
+                    total_duration_seconds = total_duration_seconds + excluded.total_duration_seconds,
+                    total_processing_time = total_processing_time + excluded.total_processing_time,
+                    total_size_mb = total_size_mb + excluded.total_size_mb
+            """, (cutoff,))
+            
+            cursor = await db.execute(
+                "DELETE FROM enhancement_requests WHERE timestamp < ?",
+                (cutoff,)
+            )
+            removed_count = cursor.rowcount
+            await db.commit()
+        
+        if removed_count > 0:
+            print(f"Retention: Compacted {removed_count} requests older than {retention_days} days")
+            
+    except Exception as e:
+        print(f"Retention error: {e}")
@@ -0,0 +1,164 @@
+import struct
+import subprocess
+import warnings
+import wave
+from array import array
+from pathlib import Path
+from typing import Optional
+
+from pydub import AudioSegment
+
+# audioop gives us C-level min/max per bucket (also used by pydub itself)
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    import audioop
+
+# Binary sidecar layout (little-endian):
+#   header: magic, version, level count, sample rate, total frames
+#   per level: samples_per_pixel, bucket count, byte offset of the level data
+#   data: int8 (min, max) pairs per bucket, finest level first
+PEAKS_MAGIC = b"BPKS"
+PEAKS_VERSION = 1
+PEAKS_HEADER = struct.Struct("<4sHHIQ")
+PEAKS_LEVEL = struct.Struct("<III")
+
+# Zoom levels in samples per pixel, each one 4x coarser than the previous
+PEAKS_LEVELS = (256, 1024, 4096, 16384, 65536)
+
+# Number of base buckets decoded per read
+CHUNK_BUCKETS = 1024
+
+PEAKS_SUFFIX = ".peaks"
+ORIGINAL_PEAKS_SUFFIX = ".original.peaks"
+
+
+def peaks_path_for(audio_path: Path, original: bool = False) -> Path:
+    """Get the sidecar path for an enhanced file (or its original upload)"""
+    suffix = ORIGINAL_PEAKS_SUFFIX if original else PEAKS_SUFFIX
+    return audio_path.with_name(audio_path.name + suffix)
+
+
+def _quantize(value: int) -> int:
+    """Scale a signed 16-bit sample down to int8"""
+    return max(-128, min(127, value >> 8))
+
+
+def _open_pcm_stream(file_path: Path):
+    """Open any audio file as a stream of interleaved 16-bit PCM frames.
+
+    Plain 16-bit WAVs are read directly; everything else is decoded through
+    ffmpeg into a pipe so the file is never fully loaded into memory.
+    Returns (sample_rate, channels, read_frames, close).
+    """
+    try:
+        wav = wave.open(str(file_path), "rb")
+    except (wave.Error, EOFError):
+        wav = None
+
+    if wav is not None:
+        if wav.getsampwidth() == 2:
+            return wav.getframerate(), wav.getnchannels(), wav.readframes, wav.close
+        wav.close()
+
+    # Probe channels/rate without decoding the whole file
+    from pydub.utils import mediainfo
+    info = mediainfo(str(file_path))
+    sample_rate = int(info.get("sample_rate") or 44100)
+    channels = int(info.get("channels") or 1)
+
+    process = subprocess.Popen(
+        [
+            AudioSegment.converter, "-v", "error", "-i", str(file_path),
+            "-f", "s16le", "-acodec", "pcm_s16le", "-"
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL
+    )
+    frame_size = 2 * channels
+
+    def read_frames(count: int) -> bytes:
+        return process.stdout.read(count * frame_size)
+
+    def close():
+        process.stdout.close()
+        process.wait()
+
+    return sample_rate, channels, read_frames, close
+
+
+def _reduce(mins: array, maxs: array, factor: int) -> tuple[array, array]:
+    """Merge every `factor` buckets of a level into one bucket"""
+    out_min = array("b")
+    out_max = array("b")
+    for i in range(0, len(mins), factor):
+        out_min.append(min(mins[i:i + factor]))
+        out_max.append(max(maxs[i:i + factor]))
+    return out_min, out_max
+
+
+def compute_peaks(file_path: Path) -> tuple[int, int, list[tuple[int, array, array]]]:
+    """Compute min/max peaks for all zoom levels in one pass over the audio.
+
+    Returns (sample_rate, total_frames, levels) where each level is
+    (samples_per_pixel, mins, maxs). Channels are folded together so each
+    bucket covers the envelope of all channels.
+    """
+    sample_rate, channels, read_frames, close = _open_pcm_stream(file_path)
+    base = PEAKS_LEVELS[0]
+    base_min = array("b")
+    base_max = array("b")
+    total_frames = 0
+    remainder = b""
+
+    try:
+        while True:
+            data = read_frames(base * CHUNK_BUCKETS)
+            if not data:
+                break
+            data = remainder + data
+            usable = len(data) - len(data) % (2 * channels)
+            remainder = data[usable:]
+            total_frames += usable // (2 * channels)
+
+            step = 2 * base * channels
+            for start in range(0, usable, step):
+                low, high = audioop.minmax(data[start:min(start + step, usable)], 2)
+                base_min.append(_quantize(low))
+                base_max.append(_quantize(high))
+    finally:
+        close()
+
+    levels = [(base, base_min, base_max)]
+    mins, maxs = base_min, base_max
+    for previous, samples_per_pixel in zip(PEAKS_LEVELS, PEAKS_LEVELS[1:]):
+        mins, maxs = _reduce(mins, maxs, samples_per_pixel // previous)
+        levels.append((samples_per_pixel, mins, maxs))
+
+    return sample_rate, total_frames, levels
+
+
+def write_peaks(file_path: Path, peaks_path: Path) -> Optional[Path]:
+    """Compute peaks for an audio file and store them as a binary sidecar"""
+    try:
+        sample_rate, total_frames, levels = compute_peaks(file_path)
+
+        offset = PEAKS_HEADER.size + PEAKS_LEVEL.size * len(levels)
+        header = [PEAKS_HEADER.pack(PEAKS_MAGIC, PEAKS_VERSION, len(levels), sample_rate, total_frames)]
+        body = []
+        for samples_per_pixel, mins, maxs in levels:
+            header.append(PEAKS_LEVEL.pack(samples_per_pixel, len(mins), offset))
+            interleaved = array("b", bytes(2 * len(mins)))
+            interleaved[0::2] = mins
+            interleaved[1::2] = maxs
+            body.append(interleaved.tobytes())
+            offset += 2 * len(mins)
+
+        tmp_path = peaks_path.with_name(peaks_path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(b"".join(header))
+            f.write(b"".join(body))
+        tmp_path.replace(peaks_path)
+        return peaks_path
+    except Exception as e:
+        print(f"Error computing peaks for {file_path.name}: {e}")
+        return None
@@ -0,0 +1,308 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+import contextvars
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "true").lower() in ("1", "true", "yes")
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "20") or "20")
+# Samples older than this are dropped, so it bounds the longest request we can explain;
+# captures of longer requests are flagged with "window_truncated"
+PROFILER_WINDOW_SECONDS = int(os.getenv("PROFILER_WINDOW_SECONDS", "900") or "900")
+SLOW_REQUEST_THRESHOLD_SECONDS = float(os.getenv("SLOW_REQUEST_THRESHOLD_SECONDS", "60") or "60")
+PROFILE_MAX_CAPTURES = int(os.getenv("PROFILE_MAX_CAPTURES", "50") or "50")
+PROFILE_DIR = Path("data/profiles")
+
+
+
+class RequestTrace:
+    """Timing spans and await-chain samples of a single request"""
+
+    def __init__(self):
+        self.spans: list[dict] = []
+        # asyncio tasks serving this request (registered by the endpoint)
+        self.tasks: list[asyncio.Task] = []
+        # Folded await chains of those tasks, filled by the sampler thread
+        self.await_stacks: Counter = Counter()
+
+
+# Trace of the request currently being handled
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+# Leaf frames of threads that are just waiting: idle pool workers and the
+# event loop blocked in select (or in runners.py under uvloop)
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("selectors.py", "select"),
+    ("runners.py", "run"),
+}
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+def _fold_await_chain(task: asyncio.Task) -> Optional[str]:
+    """Render what a (suspended) task is awaiting, outermost coroutine first"""
+    parts = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            # Leaf future/awaitable the chain is blocked on
+            parts.append(f"<{type(awaitable).__name__}>")
+            break
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return ";".join(parts) if parts else None
+
+
+def _fold_stack(frame) -> str:
+    """Render a frame chain in collapsed-stack format (root first)"""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class SamplingProfiler:
+    """Low-overhead wall-clock sampler over all Python threads.
+
+    A daemon thread snapshots `sys._current_frames()` every interval and
+    keeps one ring entry per tick with the folded stacks of all busy
+    threads, so the ring always covers `window_seconds` regardless of the
+    thread count. Slow requests later pick the ticks that fall into their
+    time window.
+    """
+
+    def __init__(self, interval_ms: float, window_seconds: int):
+        self.interval = interval_ms / 1000.0
+        self.samples: deque[tuple[float, tuple[tuple[str, str], ...]]] = deque(
+            maxlen=max(1, int(window_seconds / self.interval))
+        )
+        self.enabled = False
+        self._stop_event: Optional[threading.Event] = None
+        self._lock = threading.Lock()
+        self._stack_cache: dict[str, str] = {}
+        # Requests in flight whose tasks are sampled on every tick
+        self._traces: set[RequestTrace] = set()
+
+    def register(self, trace: RequestTrace):
+        with self._lock:
+            self._traces.add(trace)
+
+    def unregister(self, trace: RequestTrace):
+        with self._lock:
+            self._traces.discard(trace)
+
+    def oldest_sample(self) -> Optional[float]:
+        with self._lock:
+            return self.samples[0][0] if self.samples else None
+
+    def start(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        self._stop_event = threading.Event()
+        threading.Thread(
+            target=self._run, args=(self._stop_event,), name="sampling-profiler", daemon=True
+        ).start()
+
+    def stop(self):
+        if self._stop_event is not None:
+            self._stop_event.set()
+        self.enabled = False
+        self._stop_event = None
+        with self._lock:
+            self.samples.clear()
+            self._stack_cache.clear()
+
+    def _run(self, stop_event: threading.Event):
+        own_id = threading.get_ident()
+        while not stop_event.is_set():
+            now = time.monotonic()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            with self._lock:
+                tick = []
+                for thread_id, frame in frames.items():
+                    if thread_id == own_id or _is_idle(frame):
+                        continue
+                    stack = _fold_stack(frame)
+                    # Intern identical stacks to keep the ring small
+                    stack = self._stack_cache.setdefault(stack, stack)
+                    tick.append((names.get(thread_id, str(thread_id)), stack))
+                self.samples.append((now, tuple(tick)))
+
+                # Per-request await chains: shows what a suspended request waits on
+                for trace in self._traces:
+                    for task in list(trace.tasks):
+                        if task.done():
+                            continue
+                        chain = _fold_await_chain(task)
+                        if chain:
+                            trace.await_stacks[chain] += 1
+                if len(self._stack_cache) > 10000:
+                    self._stack_cache.clear()
+            del frames
+            stop_event.wait(self.interval)
+
+    def collect(self, start: float, end: float) -> Counter:
+        """Folded stacks (prefixed with the thread name) sampled in [start, end]"""
+        with self._lock:
+            window = [tick for timestamp, tick in self.samples if start <= timestamp <= end]
+        return Counter(f"{thread};{stack}" for tick in window for thread, stack in tick)
+
+
+profiler = SamplingProfiler(PROFILER_INTERVAL_MS, PROFILER_WINDOW_SECONDS)
+slow_request_threshold = SLOW_REQUEST_THRESHOLD_SECONDS
+if slow_request_threshold >= PROFILER_WINDOW_SECONDS:
+    print("Warning: SLOW_REQUEST_THRESHOLD_SECONDS >= PROFILER_WINDOW_SECONDS, captures will be truncated")
+
+
+def set_slow_request_threshold(seconds: float):
+    """Change the latency above which requests are captured.
+
+    Raises ValueError unless 0 < seconds < PROFILER_WINDOW_SECONDS, since the
+    sample ring could not cover a request of that length.
+    """
+    if seconds <= 0 or seconds >= PROFILER_WINDOW_SECONDS:
+        raise ValueError(f"Threshold must be between 0 and {PROFILER_WINDOW_SECONDS} seconds (PROFILER_WINDOW_SECONDS)")
+    global slow_request_threshold
+    slow_request_threshold = seconds
+
+
+def start_trace() -> contextvars.Token:
+    """Begin collecting timing spans and await samples for the current request"""
+    trace = RequestTrace()
+    profiler.register(trace)
+    return _current_trace.set(trace)
+
+
+def end_trace(token: contextvars.Token) -> RequestTrace:
+    """Stop collecting and return the request's trace"""
+    trace = _current_trace.get() or RequestTrace()
+    profiler.unregister(trace)
+    _current_trace.reset(token)
+    return trace
+
+
+async def register_request_task():
+    """App-wide dependency: sample the task running the endpoint for this request"""
+    trace = _current_trace.get()
+    task = asyncio.current_task()
+    if trace is not None and task is not None:
+        trace.tasks.append(task)
+
+
+@contextmanager
+def span(name: str):
+    """Record how long a named phase of the current request took"""
+    trace = _current_trace.get()
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.spans.append({"name": name, "seconds": round(time.monotonic() - start, 4)})
+
+
+def record_span(name: str, seconds: float):
+    """Record an already measured phase (e.g. queue wait) for the current request"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.spans.append({"name": name, "seconds": round(seconds, 4)})
+
+
+def save_capture(method: str, path: str, status_code: int, duration: float,
+                 start: float, end: float, trace: RequestTrace) -> Optional[str]:
+    """Write a slow-request capture to the on-disk ring buffer.
+
+    `await_stacks` only contains this request's own tasks; `stacks` is the
+    activity of all threads during the request and may include other work.
+    """
+    try:
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        stacks = profiler.collect(start, end) if profiler.enabled else Counter()
+        oldest = profiler.oldest_sample()
+
+        name = f"capture_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json"
+        capture = {
+            "timestamp": datetime.now().isoformat(),
+            "method": method,
+            "path": path,
+            "status_code": status_code,
+            "duration_seconds": round(duration, 3),
+            "spans": trace.spans,
+            "sample_interval_ms": PROFILER_INTERVAL_MS,
+            # True if the sample ring no longer reaches back to the request start
+            "window_truncated": not profiler.enabled or oldest is None or oldest > start,
+            "await_samples": sum(trace.await_stacks.values()),
+            "await_stacks": dict(trace.await_stacks.most_common()),
+            "samples": sum(stacks.values()),
+            "stacks": dict(stacks.most_common())
+        }
+        with open(PROFILE_DIR / name, "w", encoding="utf-8") as f:
+            json.dump(capture, f)
+
+        # Ring buffer: drop the oldest captures beyond the limit
+        captures = sorted(PROFILE_DIR.glob("capture_*.json"))
+        for old in captures[:-PROFILE_MAX_CAPTURES]:
+            old.unlink(missing_ok=True)
+
+        return name
+    except Exception as e:
+        print(f"Profiler capture error: {e}")
+        return None
+
+
+def list_captures() -> list[dict]:
+    """List stored captures, newest first"""
+    if not PROFILE_DIR.exists():
+        return []
+    return [
+        {"name": f.name, "size_bytes": f.stat().st_size}
+        for f in sorted(PROFILE_DIR.glob("capture_*.json"), reverse=True)
+    ]
+
+
+def capture_to_folded(capture: dict) -> str:
+    """Convert a capture to collapsed stacks (input for flamegraph.pl / speedscope).
+
+    The request's own await chains sit under "request", all thread samples
+    under "threads".
+    """
+    lines = [f"request;{stack} {count}" for stack, count in capture.get("await_stacks", {}).items()]
+    lines += [f"threads;{stack} {count}" for stack, count in capture.get("stacks", {}).items()]
+    return "\n".join(lines) + "\n"
+
+
+def get_status() -> dict:
+    """Profiler settings, buffer fill and stored captures"""
+    return {
+        "enabled": profiler.enabled,
+        "interval_ms": PROFILER_INTERVAL_MS,
+        "window_seconds": PROFILER_WINDOW_SECONDS,
+        "slow_request_threshold_seconds": slow_request_threshold,
+        "buffered_ticks": len(profiler.samples),
+        "max_captures": PROFILE_MAX_CAPTURES,
+        "captures": list_captures()
+    }
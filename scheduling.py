@@ -0,0 +1,347 @@
+import os
+import re
+import sys
+import hmac
+import heapq
+import time
+import asyncio
+import hashlib
+import secrets
+from collections import deque
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Client identity: server-issued token (bearer or header), otherwise the client IP.
+# Tokens are "<name>.<signature>", signed with CLIENT_TOKEN_SECRET; without a
+# secret, only IP addresses are used.
+CLIENT_ID_HEADER = os.getenv("CLIENT_ID_HEADER", "X-Client-ID")
+CLIENT_TOKEN_SECRET = os.getenv("CLIENT_TOKEN_SECRET", "")
+# X-Forwarded-For is only honoured when the direct peer is one of these
+TRUSTED_PROXIES = {ip.strip() for ip in os.getenv("TRUSTED_PROXIES", "").split(",") if ip.strip()}
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "20") or "20")
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10") or "10")
+# Comma separated list of client=weight pairs, e.g. "team-a=2,10.0.0.5=0.5"
+CLIENT_WEIGHTS = os.getenv("CLIENT_WEIGHTS", "")
+
+CLIENT_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Key for pseudonymising IP addresses in logs; without CLIENT_ID_HASH_KEY a
+# key is generated once and kept in data/ so pseudonyms survive restarts
+CLIENT_ID_HASH_KEY = os.getenv("CLIENT_ID_HASH_KEY", "")
+CLIENT_ID_HASH_KEY_FILE = Path("data/client_id_hash.key")
+_pseudonym_key: Optional[bytes] = None
+
+
+def _get_pseudonym_key() -> bytes:
+    """Load (or create on first use) the stable key for IP pseudonyms"""
+    global _pseudonym_key
+    if _pseudonym_key is None:
+        if CLIENT_ID_HASH_KEY:
+            _pseudonym_key = CLIENT_ID_HASH_KEY.encode()
+        elif CLIENT_ID_HASH_KEY_FILE.exists():
+            _pseudonym_key = bytes.fromhex(CLIENT_ID_HASH_KEY_FILE.read_text().strip())
+        else:
+            CLIENT_ID_HASH_KEY_FILE.parent.mkdir(parents=True, exist_ok=True)
+            _pseudonym_key = secrets.token_bytes(32)
+            CLIENT_ID_HASH_KEY_FILE.write_text(_pseudonym_key.hex())
+    return _pseudonym_key
+
+
+def parse_client_weights(value: str) -> dict[str, float]:
+    """Parse CLIENT_WEIGHTS into a dict, ignoring malformed entries"""
+    weights = {}
+    for entry in value.split(","):
+        client, _, weight = entry.strip().partition("=")
+        try:
+            if client and float(weight) > 0:
+                weights[client] = float(weight)
+        except ValueError:
+            print(f"Ignoring invalid client weight: {entry}")
+    return weights
+
+
+def _sign_client_name(name: str) -> str:
+    return hmac.new(CLIENT_TOKEN_SECRET.encode(), name.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def issue_client_token(name: str) -> str:
+    """Create a client token for `name` (requires CLIENT_TOKEN_SECRET)"""
+    if not CLIENT_TOKEN_SECRET:
+        raise ValueError("CLIENT_TOKEN_SECRET is not configured")
+    if not CLIENT_NAME_PATTERN.match(name):
+        raise ValueError("Client name may only contain letters, digits, '-' and '_'")
+    return f"{name}.{_sign_client_name(name)}"
+
+
+def verify_client_token(token: str) -> Optional[str]:
+    """Return the client name of a valid server-issued token, else None"""
+    if not CLIENT_TOKEN_SECRET:
+        return None
+    name, _, signature = token.strip().rpartition(".")
+    if not CLIENT_NAME_PATTERN.match(name):
+        return None
+    if not hmac.compare_digest(signature, _sign_client_name(name)):
+        return None
+    return name
+
+
+def get_client_ip(request: Request) -> str:
+    """Client IP, taking X-Forwarded-For into account only behind trusted proxies"""
+    peer = request.client.host if request.client else "unknown"
+    if peer not in TRUSTED_PROXIES:
+        return peer
+
+    forwarded_for = request.headers.get("x-forwarded-for", "")
+    # Walk from the right: the first hop not added by one of our proxies is the client
+    for hop in reversed([h.strip() for h in forwarded_for.split(",") if h.strip()]):
+        if hop not in TRUSTED_PROXIES:
+            return hop
+    return peer
+
+
+def get_client_id(request: Request) -> str:
+    """Identify the calling client by server-issued token or IP"""
+    auth = request.headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        name = verify_client_token(auth[7:])
+        if name:
+            return name
+
+    client_header = request.headers.get(CLIENT_ID_HEADER)
+    if client_header:
+        name = verify_client_token(client_header)
+        if name:
+            return name
+
+    return get_client_ip(request)
+
+
+def pseudonymize_client_id(client_id: str) -> str:
+    """Issued client names are kept, IP addresses are replaced by a keyed hash"""
+    if CLIENT_NAME_PATTERN.match(client_id):
+        return client_id
+    digest = hmac.new(_get_pseudonym_key(), client_id.encode(), hashlib.sha256).hexdigest()[:12]
+    return f"ip-{digest}"
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, amount: float = 1) -> bool:
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def retry_after(self, amount: float = 1) -> float:
+        """Seconds until `amount` tokens are available"""
+        self._refill()
+        if self.rate <= 0:
+            return float("inf")
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class RateLimiter:
+    """Per-client token buckets; full buckets are dropped since they hold no state"""
+
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.buckets: dict[str, TokenBucket] = {}
+        # A bucket is full again at the latest after this long, so sweeping
+        # once per interval keeps the dict at the number of recent clients
+        self.sweep_interval = burst / self.rate if self.rate > 0 else 3600.0
+        self.last_sweep = time.monotonic()
+
+    def _sweep(self):
+        now = time.monotonic()
+        if now - self.last_sweep < self.sweep_interval:
+            return
+        self.last_sweep = now
+        self.buckets = {client_id: bucket for client_id, bucket in self.buckets.items() if not bucket.is_full()}
+
+    def check(self, client_id: str):
+        """Consume one token for the client or raise 429"""
+        self._sweep()
+        bucket = self.buckets.get(client_id)
+        if bucket is None:
+            bucket = self.buckets[client_id] = TokenBucket(self.rate, self.burst)
+
+        if not bucket.consume():
+            retry_after = bucket.retry_after()
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests. Please try again later.",
+                headers={"Retry-After": str(int(retry_after) + 1)}
+            )
+
+
+class ClientQueue:
+    """Waiting requests and usage counters for a single client"""
+
+    def __init__(self, client_id: str, weight: float):
+        self.client_id = client_id
+        self.weight = weight
+        self.virtual_time = 0.0
+        self.waiters: deque[asyncio.Future] = deque()
+        # True while the client has an entry in the scheduler's ready heap
+        self.in_heap = False
+        self.active = 0
+        self.served = 0
+        self.total_wait = 0.0
+        self.last_wait = 0.0
+
+
+class FairScheduler:
+    """Weighted fair-share scheduler for enhancement slots.
+
+    Every client has its own FIFO queue. When a slot frees up, the client
+    with the lowest virtual time gets it, and its virtual time advances by
+    1/weight. A client dropping a large batch therefore only gets its share
+    of the slots while others are waiting. Clients with queued work sit in a
+    heap keyed by virtual time; idle clients are forgotten.
+    """
+
+    def __init__(self, slots: int, weights: Optional[dict[str, float]] = None):
+        self.slots = slots
+        self.available = slots
+        self.weights = weights or {}
+        self.clients: dict[str, ClientQueue] = {}
+        self.ready: list[tuple[float, int, ClientQueue]] = []
+        self._sequence = 0
+        # Virtual time of the most recent dispatch
+        self.virtual_time = 0.0
+
+    def _get_client(self, client_id: str) -> ClientQueue:
+        client = self.clients.get(client_id)
+        if client is None:
+            client = self.clients[client_id] = ClientQueue(client_id, self.weights.get(client_id, 1.0))
+        if not client.in_heap and not client.waiters and not client.active:
+            # Idle clients must not bank credit: start at the current virtual time
+            client.virtual_time = max(client.virtual_time, self.virtual_time)
+        return client
+
+    def _push(self, client: ClientQueue):
+        self._sequence += 1
+        heapq.heappush(self.ready, (client.virtual_time, self._sequence, client))
+        client.in_heap = True
+
+    def _evict_if_idle(self, client: ClientQueue):
+        if not client.waiters and not client.active and not client.in_heap:
+            self.clients.pop(client.client_id, None)
+
+    def _dispatch(self):
+        """Hand free slots to waiting clients in fair-share order"""
+        while self.available > 0 and self.ready:
+            _, _, client = heapq.heappop(self.ready)
+            client.in_heap = False
+
+            # Drop waiters cancelled while queued
+            while client.waiters and client.waiters[0].done():
+                client.waiters.popleft()
+            if not client.waiters:
+                self._evict_if_idle(client)
+                continue
+
+            future = client.waiters.popleft()
+            self.virtual_time = client.virtual_time
+            client.virtual_time += 1.0 / client.weight
+            client.active += 1
+            self.available -= 1
+            future.set_result(None)
+
+            if client.waiters:
+                self._push(client)
+
+    def _release(self, client: ClientQueue):
+        client.active -= 1
+        self.available += 1
+        self._dispatch()
+        self._evict_if_idle(client)
+
+    @asynccontextmanager
+    async def slot(self, client_id: str):
+        """Wait for a fair-share slot; yields the queue wait in seconds"""
+        client = self._get_client(client_id)
+        future = asyncio.get_event_loop().create_future()
+        client.waiters.append(future)
+        if not client.in_heap:
+            self._push(client)
+        start = time.monotonic()
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted right before cancellation
+                self._release(client)
+            else:
+                if future in client.waiters:
+                    client.waiters.remove(future)
+                self._evict_if_idle(client)
+            raise
+
+        wait_time = time.monotonic() - start
+        client.served += 1
+        client.total_wait += wait_time
+        client.last_wait = wait_time
+
+        try:
+            yield wait_time
+        finally:
+            self._release(client)
+
+    def get_stats(self) -> dict:
+        """Per-client queue length, active work and wait times"""
+        clients = {}
+        for client_id, client in self.clients.items():
+            clients[client_id] = {
+                "weight": client.weight,
+                "queued": len(client.waiters),
+                "active": client.active,
+                "served": client.served,
+                "avg_wait_seconds": round(client.total_wait / client.served, 2) if client.served else 0,
+                "last_wait_seconds": round(client.last_wait, 2)
+            }
+
+        return {
+            "slots": self.slots,
+            "available": self.available,
+            "queued": sum(len(c.waiters) for c in self.clients.values()),
+            "clients": clients
+        }
+
+
+if __name__ == "__main__":
+    # Issue a client token: python scheduling.py <client-name>
+    if len(sys.argv) != 2:
+        print("Usage: python scheduling.py <client-name>")
+        sys.exit(1)
+    try:
+        print(issue_client_token(sys.argv[1]))
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,364 @@
+let selectedFile = null;
+let selectedPreset = 'custom';
+
+// Drag and Drop
+const uploadSection = document.getElementById('uploadSection');
+const audioInput = document.getElementById('audioInput');
+const enhanceBtn = document.getElementById('enhanceBtn');
+
+uploadSection.addEventListener('dragover', (e) => {
+    e.preventDefault();
+    uploadSection.classList.add('dragover');
+});
+
+uploadSection.addEventListener('dragleave', () => {
+    uploadSection.classList.remove('dragover');
+});
+
+uploadSection.addEventListener('drop', (e) => {
+    e.preventDefault();
+    uploadSection.classList.remove('dragover');
+    
+    const files = e.dataTransfer.files;
+    if (files.length > 0 && files[0].type.startsWith('audio/')) {
+        handleFileSelect(files[0]);
+    }
+});
+
+audioInput.addEventListener('change', (e) => {
+    if (e.target.files.length > 0) {
+        handleFileSelect(e.target.files[0]);
+    }
+});
+
+function handleFileSelect(file) {
+    if (!file.type.startsWith('audio/')) {
+        alert('Bitte wählen Sie eine Audio-Datei (MP3 oder WAV)');
+        return;
+    }
+
+    selectedFile = file;
+    document.getElementById('fileName').textContent = file.name;
+    document.getElementById('fileSize').textContent = formatFileSize(file.size);
+    document.getElementById('fileInfo').style.display = 'block';
+    enhanceBtn.disabled = false;
+}
+
+function formatFileSize(bytes) {
+    if (bytes < 1024) return bytes + ' B';
+    if (bytes < 1024 * 1024) return (bytes / 1024).toFixed(1) + ' KB';
+    return (bytes / (1024 * 1024)).toFixed(1) + ' MB';
+}
+
+// Preset handling
+document.querySelectorAll('.preset-btn:not(.model-btn)').forEach(btn => {
+    btn.addEventListener('click', () => {
+        // Remove active class and hide all info only from preset buttons
+        document.querySelectorAll('.preset-btn:not(.model-btn)').forEach(b => {
+            b.classList.remove('active');
+            const info = b.querySelector('.preset-info');
+            if (info) info.style.display = 'none';
+        });
+        
+        // Add active class and show info for selected
+        btn.classList.add('active');
+        const selectedInfo = btn.querySelector('.preset-info');
+        if (selectedInfo) selectedInfo.style.display = 'block';
+        
+        selectedPreset = btn.dataset.preset;
+        
+        if (selectedPreset === 'custom') {
+            document.getElementById('customParams').style.display = 'block';
+        } else {
+            document.getElementById('customParams').style.display = 'none';
+        }
+    });
+});
+
+// Custom parameter sliders
+document.getElementById('loudnessTarget').addEventListener('input', (e) => {
+    document.getElementById('loudnessTargetValue').textContent = e.target.value + ' LUFS';
+});
+
+document.getElementById('loudnessPeak').addEventListener('input', (e) => {
+    document.getElementById('loudnessPeakValue').textContent = e.target.value + ' dbTP';
+});
+
+document.getElementById('enhancementLevel').addEventListener('input', (e) => {
+    document.getElementById('enhancementLevelValue').textContent = e.target.value + '%';
+});
+
+// Show custom params by default
+document.getElementById('customParams').style.display = 'block';
+
+// Model selection handling (separate from preset selection)
+let selectedModel = 'LARK';
+document.querySelectorAll('.model-btn').forEach(btn => {
+    btn.addEventListener('click', () => {
+        // Only remove active from model buttons, not preset buttons
+        document.querySelectorAll('.model-btn').forEach(b => b.classList.remove('active'));
+        btn.classList.add('active');
+        selectedModel = btn.dataset.model;
+    });
+});
+
+// Enhance button
+enhanceBtn.addEventListener('click', async () => {
+    if (!selectedFile) return;
+
+    const formData = new FormData();
+    formData.append('file', selectedFile);
+    formData.append('preset', selectedPreset);
+    
+    // Add selected model
+    formData.append('model_arch', selectedModel);
+
+    if (selectedPreset === 'custom') {
+        formData.append('loudness_target', document.getElementById('loudnessTarget').value);
+        formData.append('loudness_peak', document.getElementById('loudnessPeak').value);
+        formData.append('enhancement_level', document.getElementById('enhancementLevel').value / 100);
+    }
+
+    // Hide input form and show processing
+    document.getElementById('uploadSection').style.display = 'none';
+    document.getElementById('fileInfo').style.display = 'none';
+    enhanceBtn.style.display = 'none';
+    document.querySelector('.presets-section').style.display = 'none';
+    document.getElementById('customParams').style.display = 'none';
+    
+    document.getElementById('processing').style.display = 'block';
+    document.getElementById('resultSection').style.display = 'none';
+
+    try {
+        const response = await fetch('/api/enhance', {
+            method: 'POST',
+            body: formData
+        });
+
+        const result = await response.json();
+
+        if (response.ok) {
+            showSuccess(result);
+        } else {
+            showError(result.detail || 'Enhancement fehlgeschlagen');
+        }
+    } catch (error) {
+        showError('Netzwerkfehler: ' + error.message);
+    } finally {
+        document.getElementById('processing').style.display = 'none';
+    }
+});
+
+function showSuccess(result) {
+    const resultSection = document.getElementById('resultSection');
+    const resultContent = document.getElementById('resultContent');
+    
+    resultSection.classList.remove('error');
+    document.getElementById('resultTitle').textContent = '✅ Enhancement erfolgreich!';
+    
+    resultContent.innerHTML = `
+        <div class="stats-info">
+            <div class="stat-item">
+                <strong>${result.audio_duration}s</strong>
+                <span>Audio-Länge</span>
+            </div>
+            <div class="stat-item">
+                <strong>${result.processing_time}s</strong>
+                <span>Bearbeitungszeit</span>
+            </div>
+            <div class="stat-item">
+                <strong>${result.preset_used}</strong>
+                <span>Preset</span>
+            </div>
+        </div>
+        
+        <h4 style="margin-top: 20px;">Vorher / Nachher:</h4>
+        <div class="waveform-label">Original</div>
+        <canvas class="waveform" id="waveformOriginal"></canvas>
+        <div class="waveform-label">Enhanced</div>
+        <canvas class="waveform" id="waveformEnhanced"></canvas>
+        
+        <h4 style="margin-top: 20px;">Enhanced Audio:</h4>
+        <audio controls class="audio-player">
+            <source src="${result.download_url}" type="audio/mpeg">
+            Ihr Browser unterstützt das Audio-Element nicht.
+        </audio>
+        
+        <div style="text-align: center; margin-top: 20px;">
+            <a href="${result.download_url}" download="${result.filename}" class="download-btn">
+                ⬇️ Enhanced Audio herunterladen
+            </a>
+        </div>
+        
+        <div style="text-align: center;">
+            <button onclick="resetForm()" class="enhance-btn" style="margin-top: 20px;">
+                🎵 Neues Audio verbessern
+            </button>
+        </div>
+    `;
+    
+    resultSection.style.display = 'block';
+    
+    if (result.peaks_url) {
+        drawWaveform(document.getElementById('waveformOriginal'), result.peaks_url + '?source=original');
+        drawWaveform(document.getElementById('waveformEnhanced'), result.peaks_url);
+    }
+}
+
+// Waveform previews from precomputed peaks (see peaks.py for the layout)
+async function fetchRange(url, start, end) {
+    const response = await fetch(url, { headers: { 'Range': `bytes=${start}-${end}` } });
+    if (!response.ok) throw new Error('Peaks nicht verfügbar');
+    return new DataView(await response.arrayBuffer());
+}
+
+async function drawWaveform(canvas, url) {
+    try {
+        const width = canvas.clientWidth * (window.devicePixelRatio || 1);
+        const height = canvas.clientHeight * (window.devicePixelRatio || 1);
+        canvas.width = width;
+        canvas.height = height;
+        
+        // Header (20 bytes) and level table (12 bytes per level)
+        const header = await fetchRange(url, 0, 255);
+        const levelCount = header.getUint16(6, true);
+        const levels = [];
+        for (let i = 0; i < levelCount; i++) {
+            const base = 20 + i * 12;
+            levels.push({
+                count: header.getUint32(base + 4, true),
+                offset: header.getUint32(base + 8, true)
+            });
+        }
+        
+        // Coarsest level that still has at least one bucket per pixel
+        let level = levels[0];
+        for (const candidate of levels) {
+            if (candidate.count >= width) level = candidate;
+        }
+        if (level.count === 0) return;
+        
+        const data = await fetchRange(url, level.offset, level.offset + level.count * 2 - 1);
+        const ctx = canvas.getContext('2d');
+        const mid = height / 2;
+        ctx.fillStyle = getComputedStyle(document.documentElement).getPropertyValue('--primary-color') || '#5e35b1';
+        
+        for (let x = 0; x < width; x++) {
+            const from = Math.floor(x * level.count / width);
+            const to = Math.max(from + 1, Math.floor((x + 1) * level.count / width));
+            let min = 0, max = 0;
+            for (let i = from; i < to; i++) {
+                min = Math.min(min, data.getInt8(i * 2));
+                max = Math.max(max, data.getInt8(i * 2 + 1));
+            }
+            const top = mid - (max / 128) * mid;
+            const bottom = mid - (min / 128) * mid;
+            ctx.fillRect(x, top, 1, Math.max(1, bottom - top));
+        }
+    } catch (error) {
+        console.error('Error loading waveform:', error);
+    }
+}
+
+function showError(message) {
+    const resultSection = document.getElementById('resultSection');
+    const resultContent = document.getElementById('resultContent');
+    
+    resultSection.classList.add('error');
+    document.getElementById('resultTitle').textContent = '❌ Fehler beim Enhancement';
+    
+    resultContent.innerHTML = `
+        <p>${message}</p>
+        <button onclick="resetForm()" class="enhance-btn" style="margin-top: 20px;">
+            🔄 Erneut versuchen
+        </button>
+    `;
+    resultSection.style.display = 'block';
+}
+
+function resetForm() {
+    // Reset file selection
+    selectedFile = null;
+    document.getElementById('audioInput').value = '';
+    
+    // Show all form elements
+    document.getElementById('uploadSection').style.display = 'flex';
+    document.getElementById('fileInfo').style.display = 'none';
+    document.getElementById('enhanceBtn').style.display = 'block';
+    document.getElementById('enhanceBtn').disabled = true;
+    document.querySelector('.presets-section').style.display = 'block';
+    
+    // Show custom params if custom preset is selected
+    if (selectedPreset === 'custom') {
+        document.getElementById('customParams').style.display = 'block';
+    }
+    
+    // Hide results
+    document.getElementById('resultSection').style.display = 'none';
+}
+
+// Load week requests
+async function loadWeekRequests() {
+    try {
+        const response = await fetch('/api/week-requests');
+        const requests = await response.json();
+        
+        const weekRequestsDiv = document.getElementById('weekRequests');
+        
+        if (requests.length === 0) {
+            weekRequestsDiv.innerHTML = '<p style="text-align: center; color: #666;">Keine Anfragen in den letzten 7 Tagen</p>';
+            return;
+        }
+        
+        let tableHTML = `
+            <table class="requests-table">
+                <thead>
+                    <tr>
+                        <th>Zeitstempel</th>
+                        <th>Status</th>
+                        <th>Preset</th>
+                        <th>Audio-Dauer</th>
+                        <th>Dateigröße</th>
+                        <th>Download</th>
+                    </tr>
+                </thead>
+                <tbody>
+        `;
+        
+        requests.forEach(req => {
+            const timestamp = new Date(req.timestamp).toLocaleString('de-DE');
+            const status = req.success ? 
+                '<span class="success-badge">Erfolgreich</span>' : 
+                '<span class="error-badge">Fehler</span>';
+            
+            const downloadButton = req.success && req.enhanced_filename ? 
+                `<a href="/api/download/${req.enhanced_filename}" download class="download-btn" style="padding: 4px 12px; font-size: 0.85em;">⬇️ Download</a>` : 
+                '-';
+            
+            tableHTML += `
+                <tr>
+                    <td>${timestamp}</td>
+                    <td>${status}</td>
+                    <td>${req.preset}</td>
+                    <td>${req.duration_seconds}s</td>
+                    <td>${req.file_size_mb} MB</td>
+                    <td style="text-align: center;">${downloadButton}</td>
+                </tr>
+            `;
+        });
+        
+        tableHTML += '</tbody></table>';
+        weekRequestsDiv.innerHTML = tableHTML;
+        
+    } catch (error) {
+        console.error('Error loading week requests:', error);
+        document.getElementById('weekRequests').innerHTML = 
+            '<p style="text-align: center; color: #f44336;">Fehler beim Laden der Anfragen</p>';
+    }
+}
+
+// Load requests on page load
+loadWeekRequests();
+
+// Refresh every 30 seconds
+setInterval(loadWeekRequests, 30000);